@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify, send_from_directory
 from maincode import run_document_clustering
 from file_handler import process_uploaded_files, get_supported_formats
 import logging
+import os
 
 app = Flask(__name__, static_folder='.')
 logging.basicConfig(level=logging.INFO)
@@ -24,9 +25,12 @@ def get_formats():
 @app.route("/cluster", methods=["POST"])
 def cluster_api():
     try:
+        # Parse the request body once and reuse it below
+        payload = request.get_json(silent=True) if request.is_json else None
+        files = request.files.getlist('files')
+
         # Check if we have file uploads
-        if 'files' in request.files and len(request.files.getlist('files')) > 0:
-            files = request.files.getlist('files')
+        if files:
             documents, errors = process_uploaded_files(files)
             
             if errors:
@@ -39,12 +43,10 @@ def cluster_api():
         
         # Also check for JSON text input
         elif request.is_json:
-            data = request.get_json(silent=True)
-            
-            if not data:
+            if not payload:
                 return jsonify({"error": "No JSON received"}), 400
 
-            documents = data.get("documents", [])
+            documents = payload.get("documents", [])
             
             # INPUT VALIDATION
             if not documents or len(documents) == 0:
@@ -58,7 +60,7 @@ def cluster_api():
         else:
             return jsonify({"error": "Please provide either documents or files"}), 400
 
-        k = int(request.form.get('clusters', request.get_json(silent=True).get('clusters', 2) if request.is_json else 2))
+        k = int(request.form.get('clusters', payload.get('clusters', 2) if payload else 2))
 
         if k < 2 or k > 20:
             return jsonify({"error": "Number of clusters must be between 2 and 20"}), 400
@@ -82,4 +84,5 @@ def cluster_api():
         return jsonify({"error": f"Clustering failed: {str(e)}"}), 500
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Development server only - use gunicorn (see gunicorn.conf.py) in production
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
@@ -0,0 +1,35 @@
+"""
+One-time export of all-MiniLM-L6-v2 to ONNX with int8 dynamic quantization
+
+Usage: python export_onnx.py [output_dir]
+
+maincode.py picks up the quantized model automatically on CPU when
+<output_dir>/model_quantized.onnx exists (default dir: minilm_onnx,
+override with the ONNX_MODEL_DIR environment variable).
+Requires: pip install optimum[onnxruntime]
+"""
+
+import os
+import sys
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from transformers import AutoTokenizer
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+def export(output_dir):
+    """Export the model to ONNX and write an int8 quantized copy next to it"""
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_ID, export=True)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    quantize_dynamic(
+        os.path.join(output_dir, "model.onnx"),
+        os.path.join(output_dir, "model_quantized.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+    print(f"Quantized model written to {output_dir}")
+
+if __name__ == "__main__":
+    export(sys.argv[1] if len(sys.argv) > 1 else os.environ.get("ONNX_MODEL_DIR", "minilm_onnx"))
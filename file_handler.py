@@ -5,14 +5,23 @@ Supports: PDF, DOCX, TXT, DOC
 
 import os
 import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
 
 # Try to import optional dependencies
+# Prefer the maintained pypdf, fall back to the legacy PyPDF2
 try:
-    import PyPDF2
+    import pypdf
     HAS_PDF = True
 except ImportError:
-    HAS_PDF = False
+    try:
+        import PyPDF2 as pypdf
+        HAS_PDF = True
+    except ImportError:
+        HAS_PDF = False
 
 try:
     from docx import Document
@@ -42,60 +51,58 @@ def allowed_file(filename):
 def extract_text_from_pdf(file_path):
     """Extract text from PDF file"""
     if not HAS_PDF:
-        raise ImportError("PyPDF2 is not installed. Install with: pip install PyPDF2")
+        raise ImportError("pypdf is not installed. Install with: pip install pypdf")
     
-    text = ""
     try:
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
+            pdf_reader = pypdf.PdfReader(file)
+            # Pages share the reader's file handle, so extract them serially
+            parts = [page.extract_text() or "" for page in pdf_reader.pages]
     except Exception as e:
         raise ValueError(f"Error reading PDF: {str(e)}")
     
-    return text.strip()
+    return "\n".join(parts).strip()
 
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file"""
     if not HAS_DOCX:
         raise ImportError("python-docx is not installed. Install with: pip install python-docx")
     
-    text = ""
+    parts = []
     try:
         doc = Document(file_path)
         for paragraph in doc.paragraphs:
             if paragraph.text.strip():
-                text += paragraph.text + "\n"
+                parts.append(paragraph.text)
         
         # Also extract from tables
         for table in doc.tables:
             for row in table.rows:
                 for cell in row.cells:
                     if cell.text.strip():
-                        text += cell.text + "\n"
+                        parts.append(cell.text)
     except Exception as e:
         raise ValueError(f"Error reading DOCX: {str(e)}")
     
-    return text.strip()
+    return "\n".join(parts).strip()
 
 def extract_text_from_pptx(file_path):
     """Extract text from PPTX file"""
     if not HAS_PPTX:
         raise ImportError("python-pptx is not installed. Install with: pip install python-pptx")
     
-    text = ""
+    parts = []
     try:
         prs = Presentation(file_path)
         for slide_num, slide in enumerate(prs.slides):
-            text += f"--- Slide {slide_num + 1} ---\n"
+            parts.append(f"--- Slide {slide_num + 1} ---")
             for shape in slide.shapes:
                 if hasattr(shape, "text") and shape.text.strip():
-                    text += shape.text + "\n"
+                    parts.append(shape.text)
     except Exception as e:
         raise ValueError(f"Error reading PPTX: {str(e)}")
     
-    return text.strip()
+    return "\n".join(parts).strip()
 
 def extract_text_from_txt(file_path):
     """Extract text from TXT file"""
@@ -135,9 +142,109 @@ def extract_text_from_file(file_path, file_type):
     else:
         raise ValueError(f"Unsupported file type: {file_type}")
 
+COPY_CHUNK_SIZE = 1 << 20  # 1 MB
+MAX_EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Shared extraction pool, created on first use. Server workers are multi-threaded,
+# so children are started with forkserver/spawn rather than forked from them.
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+def _get_extract_pool():
+    """Return the shared process pool for text extraction"""
+    global _extract_pool
+    if _extract_pool is None:
+        with _extract_pool_lock:
+            if _extract_pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                _extract_pool = ProcessPoolExecutor(max_workers=MAX_EXTRACT_WORKERS, mp_context=context)
+    return _extract_pool
+
+def _discard_extract_pool(pool):
+    """Drop a broken pool so the next call to _get_extract_pool() builds a fresh one"""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is pool:
+            _extract_pool = None
+    pool.shutdown(wait=False)
+
+def _extract_in_pool(payloads):
+    """
+    Extract several uploads on the shared pool
+
+    A worker that dies (e.g. OOM-killed) breaks the whole pool, so the pool
+    is rebuilt and the batch retried once before giving up on it.
+    """
+    for _ in range(2):
+        pool = _get_extract_pool()
+        try:
+            return list(pool.map(_extract_one, payloads))
+        except BrokenProcessPool:
+            _discard_extract_pool(pool)
+    return [(None, f"Error processing {filename}: extraction worker crashed") for _, filename in payloads]
+
+def _remove_file(path):
+    """Delete a temporary file, ignoring files that are already gone"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _save_upload(file):
+    """
+    Stream an uploaded file to a temporary file, enforcing MAX_FILE_SIZE
+
+    Returns:
+        str: Path of the temporary file
+    """
+    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+        try:
+            copied = 0
+            while chunk := file.stream.read(COPY_CHUNK_SIZE):
+                copied += len(chunk)
+                if copied > MAX_FILE_SIZE:
+                    raise ValueError(f"File too large: {file.filename} (max 10MB)")
+                tmp_file.write(chunk)
+        except BaseException:
+            tmp_file.close()
+            _remove_file(tmp_file.name)
+            raise
+
+    return tmp_file.name
+
+def _extract_one(payload):
+    """
+    Extract text from a single saved upload
+
+    Runs in a worker process, so it only takes plain (tmp_path, filename) data.
+
+    Returns:
+        tuple: (text, error) - exactly one of them is None
+    """
+    tmp_path, filename = payload
+    try:
+        # Extract file extension
+        file_ext = filename.rsplit('.', 1)[1].lower()
+
+        # Extract text
+        text = extract_text_from_file(tmp_path, file_ext)
+
+        if text:
+            return text, None
+        return None, f"No text extracted from: {filename}"
+
+    except ImportError as e:
+        return None, f"Missing dependency for {filename}: {str(e)}"
+    except Exception as e:
+        return None, f"Error processing {filename}: {str(e)}"
+
 def process_uploaded_files(files):
     """
     Process multiple uploaded files and extract text
+
+    Files are parsed in parallel across a process pool since PDF/PPTX
+    parsing is CPU-bound.
     
     Args:
         files: List of file objects from Flask
@@ -147,46 +254,43 @@ def process_uploaded_files(files):
     """
     documents = []
     errors = []
+    payloads = []
     
-    for file in files:
-        if file.filename == '':
-            errors.append("Empty filename")
-            continue
-        
-        if not allowed_file(file.filename):
-            errors.append(f"File type not allowed: {file.filename}")
-            continue
-        
-        if len(file.read()) > MAX_FILE_SIZE:
-            errors.append(f"File too large: {file.filename} (max 10MB)")
-            file.seek(0)
-            continue
-        
-        file.seek(0)  # Reset file pointer
-        
-        try:
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                file.save(tmp_file.name)
-                
-                # Extract file extension
-                file_ext = file.filename.rsplit('.', 1)[1].lower()
-                
-                # Extract text
-                text = extract_text_from_file(tmp_file.name, file_ext)
-                
-                if text:
-                    documents.append(text)
-                else:
-                    errors.append(f"No text extracted from: {file.filename}")
-                
-                # Clean up
-                os.unlink(tmp_file.name)
+    try:
+        for file in files:
+            if file.filename == '':
+                errors.append("Empty filename")
+                continue
+            
+            if not allowed_file(file.filename):
+                errors.append(f"File type not allowed: {file.filename}")
+                continue
+            
+            # Single streaming copy to disk, which also enforces the size limit
+            try:
+                tmp_path = _save_upload(file)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            
+            payloads.append((tmp_path, file.filename))
         
-        except ImportError as e:
-            errors.append(f"Missing dependency for {file.filename}: {str(e)}")
-        except Exception as e:
-            errors.append(f"Error processing {file.filename}: {str(e)}")
+        if not payloads:
+            results = []
+        elif len(payloads) == 1:
+            results = [_extract_one(payloads[0])]
+        else:
+            results = _extract_in_pool(payloads)
+    finally:
+        # Clean up even if a parser or the worker pool failed
+        for tmp_path, _ in payloads:
+            _remove_file(tmp_path)
+    
+    for text, error in results:
+        if error:
+            errors.append(error)
+        else:
+            documents.append(text)
     
     return documents, errors
 
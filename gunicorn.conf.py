@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration for serving the clustering app
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = os.cpu_count() or 2
+worker_class = "gthread"
+threads = 4
+timeout = 120  # Clustering large uploads can take a while
+
+# Import the app once in the master so workers share its memory (copy-on-write)
+preload_app = True
+
+# Keep workers x torch threads from oversubscribing the CPU
+os.environ.setdefault("TORCH_NUM_THREADS", "2")
+
+def pre_fork(server, worker):
+    """Load a fork-safe model in the master so every worker inherits the same weights"""
+    import maincode
+    if maincode.model_is_fork_safe():
+        maincode.get_model()
+
+def post_worker_init(worker):
+    """Apply the thread limit in each worker and load the model if the master could not"""
+    import maincode
+    maincode.configure_torch_threads()
+    maincode.get_model()
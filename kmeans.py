@@ -0,0 +1,60 @@
+"""
+Lightweight K-Means for sentence embeddings
+Used when faiss is not installed; assignment and centroid updates are float32 BLAS matmuls
+"""
+
+import numpy as np
+from sklearn.cluster import kmeans_plusplus
+
+def _centroid_sums(X, labels, k):
+    """Per-cluster sums of the rows of X as a one-hot matmul"""
+    onehot = np.zeros((X.shape[0], k), dtype=X.dtype)
+    onehot[np.arange(X.shape[0]), labels] = 1
+    return onehot.T @ X
+
+def spherical_kmeans(X, k, n_init=3, max_iter=20, random_state=42):
+    """
+    K-Means on unit-length embeddings, using cosine similarity
+
+    With normalized rows and centroids, nearest centroid by L2 is the one
+    with the largest dot product, so each assignment step is one X @ C.T
+    matrix multiply (float32 BLAS).
+
+    Args:
+        X (ndarray): (n, d) embeddings
+        k (int): Number of clusters
+
+    Returns:
+        ndarray: Cluster label for each row of X
+    """
+    # Normalize into a new array so the caller's embeddings are left untouched
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    rng = np.random.RandomState(random_state)
+
+    best_labels = None
+    best_score = -np.inf
+    for _ in range(n_init):
+        C, _ = kmeans_plusplus(X, k, random_state=rng)
+        C = np.ascontiguousarray(C, dtype=np.float32)
+        labels = None
+
+        for _ in range(max_iter):
+            sims = X @ C.T
+            new_labels = sims.argmax(axis=1)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+            # Empty clusters keep their previous centroid
+            sums = _centroid_sums(X, labels, k)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            nonempty = norms[:, 0] > 0
+            C[nonempty] = sums[nonempty] / norms[nonempty]
+
+        score = sims[np.arange(X.shape[0]), labels].sum()
+        if score > best_score:
+            best_score = score
+            best_labels = labels
+
+    return best_labels
@@ -1,36 +1,273 @@
 from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
 from sklearn.feature_extraction.text import TfidfVectorizer
+from transformers import AutoTokenizer
+from collections import OrderedDict, defaultdict
+from kmeans import spherical_kmeans
 import numpy as np
+import hashlib
+import os
+import torch
+import string
+import threading
 import re
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# faiss is optional; fall back to kmeans.spherical_kmeans when it is missing
+try:
+    import faiss
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+# Optional int8 ONNX Runtime encoder for CPU (see export_onnx.py)
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    HAS_ONNX = True
+except ImportError:
+    HAS_ONNX = False
+
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "minilm_onnx")
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
+# Run on GPU with FP16 weights when available, otherwise allow reduced-precision CPU matmuls
+device = "cuda" if torch.cuda.is_available() else "cpu"
+ENCODE_BATCH_SIZE = 256 if device == "cuda" else 128
+# Tokens per document fed to the transformer. Attention and FFN cost grow with
+# sequence length, so 128 (half of all-MiniLM-L6-v2's 256 default) cuts
+# encode time on long uploads - at the cost of embedding each document from its
+# first ~100 words only. Raise to 256 when long PDFs/DOCX cluster poorly.
+MAX_SEQ_LENGTH = int(os.environ.get("MAX_SEQ_LENGTH", 128))
+
+# Loaded on first use so importing this module (and starting Flask) stays fast
+_model = None
+_model_lock = threading.Lock()
+
+class OnnxEncoder:
+    """Quantized MiniLM on ONNX Runtime with the same encode() interface as SentenceTransformer"""
+
+    def __init__(self, model_dir, max_length=MAX_SEQ_LENGTH):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=ONNX_MODEL_FILE)
+        self.max_length = max_length
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False,
+               show_progress_bar=False):
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt",
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+
+            # Mean pooling over real tokens only
+            mask = inputs["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            if normalize_embeddings:
+                pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+            batches.append(pooled.cpu().numpy())
+
+        return np.vstack(batches)
+
+def configure_torch_threads():
+    """Limit intra-op threads when several server workers share the CPU"""
+    num_threads = os.environ.get("TORCH_NUM_THREADS")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+def _use_onnx():
+    """True when the quantized ONNX model will be used instead of SentenceTransformer"""
+    onnx_path = os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)
+    return device == "cpu" and HAS_ONNX and os.path.exists(onnx_path)
+
+def model_is_fork_safe():
+    """
+    True when the model can be loaded before forking worker processes
+
+    CUDA cannot be re-initialized in a forked child and ONNX Runtime
+    sessions are not fork-safe, so only the CPU SentenceTransformer qualifies.
+    """
+    return device == "cpu" and not _use_onnx()
+
+def _load_model():
+    """Load the encoder: quantized ONNX on CPU when exported, else SentenceTransformer"""
+    configure_torch_threads()
+
+    if _use_onnx():
+        print(f"Loading quantized ONNX model from {ONNX_MODEL_DIR}")
+        return OnnxEncoder(ONNX_MODEL_DIR)
+
+    model = SentenceTransformer("all-MiniLM-L6-v2", device=device)
+    model.max_seq_length = MAX_SEQ_LENGTH
+
+    # Make sure tokenization runs on the Rust-backed fast tokenizer
+    if not getattr(model.tokenizer, "is_fast", False):
+        model.tokenizer = AutoTokenizer.from_pretrained(
+            "sentence-transformers/all-MiniLM-L6-v2", use_fast=True
+        )
+
+    if device == "cuda":
+        model = model.half()
+    else:
+        torch.set_float32_matmul_precision("medium")
+    return model
+
+def get_model():
+    """Return the shared encoder, loading it on first call"""
+    global _model
+    # Double-checked so concurrent first requests load the model only once
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _load_model()
+    return _model
+
+# Embedding cache: 16-byte BLAKE2b digest of cleaned text -> embedding vector (LRU bounded)
+EMBEDDING_CACHE_SIZE = 10000
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+class _CleanTable(dict):
+    """str.translate table mapping every non-alphanumeric character to a space"""
+    _KEEP = frozenset(string.ascii_lowercase + string.digits)
+
+    def __missing__(self, codepoint):
+        # Filled lazily so characters beyond Latin-1 are handled too
+        value = codepoint if chr(codepoint) in self._KEEP else " "
+        self[codepoint] = value
+        return value
+
+_CLEAN_TABLE = _CleanTable((c, c if chr(c) in _CleanTable._KEEP else " ") for c in range(256))
+_RE_WS = re.compile(r"\s+")
 
 def clean_text(t):
     """Clean and normalize text"""
-    t = t.lower()
-    t = re.sub(r"[^a-zA-Z0-9\s]", " ", t)
-    t = re.sub(r"\s+", " ", t)  # Remove extra whitespace
+    t = t.lower().translate(_CLEAN_TABLE)
+    t = _RE_WS.sub(" ", t)  # Remove extra whitespace
     return t.strip()
 
-def extract_topic(docs):
-    """Extract top keywords from documents in a cluster"""
-    if not docs:
-        return "No topic"
+def clean_documents(documents):
+    """
+    Clean all non-empty documents
+
+    Returns:
+        tuple: (cleaned texts, indices of those documents in the input)
+    """
+    original_indices = [i for i, d in enumerate(documents) if d.strip()]
+    cleaned = [clean_text(documents[i]) for i in original_indices]
+    return cleaned, original_indices
+
+def encode_documents(cleaned):
+    """Encode cleaned documents, reusing cached embeddings where possible"""
+    keys = [hashlib.blake2b(t.encode("utf-8"), digest_size=16).digest() for t in cleaned]
+
+    # Snapshot this batch's cached vectors so eviction cannot drop them mid-request,
+    # and collect the documents still to encode (deduped within the batch too)
+    vectors = {}
+    miss_keys = {}
+    with _embedding_cache_lock:
+        for key, t in zip(keys, cleaned):
+            if key in vectors or key in miss_keys:
+                continue
+            emb = _embedding_cache.get(key)
+            if emb is not None:
+                _embedding_cache.move_to_end(key)
+                vectors[key] = emb
+            else:
+                miss_keys[key] = t
+    miss_texts = list(miss_keys.values())
+
+    print(f"Embedding cache: {len(cleaned) - len(miss_texts)} hits, {len(miss_texts)} misses")
+
+    if miss_texts:
+        # Normalized embeddings make KMeans' L2 distance equivalent to cosine distance
+        with torch.inference_mode():
+            new_embeddings = get_model().encode(
+                miss_texts,
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        # Copy each row so a cached vector doesn't keep its whole batch matrix alive
+        vectors.update((key, np.array(emb)) for key, emb in zip(miss_keys, new_embeddings))
+
+        with _embedding_cache_lock:
+            for key in miss_keys:
+                _embedding_cache[key] = vectors[key]
+            while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+
+    return np.vstack([vectors[key] for key in keys])
+
+def cluster_embeddings(embeddings, k):
+    """Assign each embedding to one of k clusters"""
+    if HAS_FAISS:
+        emb = np.ascontiguousarray(embeddings, dtype=np.float32)
+        km = faiss.Kmeans(emb.shape[1], k, niter=20, nredo=3, seed=42, verbose=False)
+        km.train(emb)
+        _, labels = km.index.search(emb, 1)
+        return labels.ravel()
+
+    return spherical_kmeans(embeddings, k)
+
+def _load_warmup_vectorizer(path):
+    """Fit a TF-IDF model on a warmup corpus file (one document per line)"""
+    with open(path, "r", encoding="utf-8") as f:
+        cleaned, _ = clean_documents(f.read().splitlines())
+    vectorizer = TfidfVectorizer(stop_words="english", max_features=3000, min_df=1).fit(cleaned)
+    print(f"Fitted TF-IDF vocabulary on {len(cleaned)} warmup documents from {path}")
+    return vectorizer, vectorizer.get_feature_names_out()
+
+# Optional stable vocabulary: fit once at startup, then only transform per request
+WARMUP_CORPUS_PATH = os.environ.get("WARMUP_CORPUS_PATH")
+_vectorizer, _vectorizer_terms = (
+    _load_warmup_vectorizer(WARMUP_CORPUS_PATH) if WARMUP_CORPUS_PATH else (None, None)
+)
 
+def build_tfidf(cleaned):
+    """
+    Build the TF-IDF matrix for all cleaned documents
+
+    Uses the warmup vectorizer when one was fitted at startup, otherwise
+    fits a new one on these documents.
+
+    Returns:
+        tuple: (document-term matrix, feature names), or (None, None) if no
+        vocabulary could be built
+    """
     try:
+        if _vectorizer is not None:
+            return _vectorizer.transform(cleaned).tocsr(), _vectorizer_terms
+
         vectorizer = TfidfVectorizer(stop_words="english", max_features=3000, min_df=1)
-        X = vectorizer.fit_transform(docs)
-        
-        if X.shape[0] == 0 or X.shape[1] == 0:
+        X = vectorizer.fit_transform(cleaned)
+        return X.tocsr(), vectorizer.get_feature_names_out()
+    except Exception as e:
+        print(f"Error building TF-IDF model: {e}")
+        return None, None
+
+def extract_topic(X, terms, rows):
+    """Extract top keywords for a cluster from its rows of the shared TF-IDF matrix"""
+    if X is None or len(rows) == 0:
+        return "No topic"
+
+    try:
+        if X.shape[1] == 0:
             return "No topic"
         
-        terms = vectorizer.get_feature_names_out()
-        sums = np.asarray(X.sum(axis=0)).ravel()
+        sums = np.asarray(X[rows].sum(axis=0)).ravel()
         
-        # Get top 3 terms
-        top_indices = sums.argsort()[::-1][:3]
-        top = terms[top_indices]
+        # Get top 3 terms, ignoring terms that never appear in this cluster
+        n_top = min(3, len(sums))
+        if len(sums) > n_top:
+            idx = np.argpartition(sums, -n_top)[-n_top:]
+        else:
+            idx = np.arange(len(sums))
+        top_indices = idx[np.argsort(-sums[idx])]
+        top = terms[top_indices[sums[top_indices] > 0]]
         
         return ", ".join(top) if len(top) > 0 else "No topic"
     except Exception as e:
@@ -45,32 +282,41 @@ def run_document_clustering(documents, k):
         raise ValueError("No documents provided")
     
     # CLEAN DOCS - keep track of original indices
-    cleaned = []
-    original_indices = []
-    for i, d in enumerate(documents):
-        if d.strip():
-            cleaned.append(clean_text(d))
-            original_indices.append(i)
+    cleaned, original_indices = clean_documents(documents)
     
     if len(cleaned) < k:
         raise ValueError(f"Number of clusters ({k}) cannot exceed number of documents ({len(cleaned)})")
 
-    # EMBEDDINGS
-    print(f"Encoding {len(cleaned)} documents...")
-    embeddings = model.encode(cleaned)
+    # TRIVIAL CASES - the labels are known without embedding anything
+    if k == 1:
+        labels = np.zeros(len(cleaned), dtype=int)
+    elif len(cleaned) == k:
+        labels = np.arange(k)
+    else:
+        # EMBEDDINGS
+        print(f"Encoding {len(cleaned)} documents...")
+        embeddings = encode_documents(cleaned)
 
-    # KMEANS CLUSTERING
-    print(f"Clustering into {k} clusters...")
-    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10, max_iter=300)
-    labels = kmeans.fit_predict(embeddings)
+        # KMEANS CLUSTERING
+        print(f"Clustering into {k} clusters...")
+        labels = cluster_embeddings(embeddings, k)
+
+    # TOPIC KEYWORDS - one TF-IDF fit shared by every cluster
+    X, terms = build_tfidf(cleaned)
 
     # BUILD CLUSTER RESPONSE
     clusters = {}
     topics = {}
 
+    # Bucket row indices by label in a single pass
+    buckets = defaultdict(list)
+    for i, cid in enumerate(labels):
+        buckets[int(cid)].append(i)
+
     for cid in range(k):
-        docs_in_cluster = [documents[original_indices[i]] for i in range(len(cleaned)) if labels[i] == cid]
-        topic = extract_topic(docs_in_cluster)
+        rows = buckets[cid]
+        docs_in_cluster = [documents[original_indices[i]] for i in rows]
+        topic = extract_topic(X, terms, rows)
 
         clusters[cid] = {
             "topic": topic,